@@ -0,0 +1,211 @@
+# callibirate_lanes.py
+# Click-based lane calibration tool.
+# Click the corners of lane 1, press 'n', click the corners of lane 2,
+# then press 's' to save. The saved polygons feed congestion_analyse.
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from congestion_analyse.density import build_lane_mask
+
+WINDOW = "Lane Calibration"
+
+points = {1: [], 2: []}
+points_np = {1: None, 2: None}  # converted once per click, not per frame
+current_lane = 1
+overlay_dirty = True  # only rebuild the preview after a click/key event
+
+# Static annotation layer (circles + labels): clicks are stamped into it
+# once, and rebuilds just masked-copy it over the frame instead of
+# re-drawing every point.
+annot_layer = None
+annot_mask = None
+
+LANE_COLORS = {1: (0, 255, 0), 2: (0, 200, 255)}
+
+
+def _stamp_point(lane_id, p, idx):
+    color = LANE_COLORS[lane_id]
+    cv2.circle(annot_layer, p, 5, color, -1)
+    cv2.putText(annot_layer, str(idx), (p[0] + 6, p[1] - 6),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    cv2.circle(annot_mask, p, 5, 255, -1)
+    cv2.putText(annot_mask, str(idx), (p[0] + 6, p[1] - 6),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, 255, 1)
+
+
+def _rebuild_annotations():
+    """Re-stamp every stored point (used after a lane reset)."""
+    annot_layer[:] = 0
+    annot_mask[:] = 0
+    for lane_id, pts in points.items():
+        for i, p in enumerate(pts):
+            _stamp_point(lane_id, p, i + 1)
+
+
+def order_polygon(pts_np):
+    """Order clicked vertices counter-clockwise around their centroid so
+    the outline can be drawn directly, without a convex-hull pass."""
+    center = pts_np.mean(axis=0)
+    angles = np.arctan2(pts_np[:, 1] - center[1], pts_np[:, 0] - center[0])
+    return pts_np[np.argsort(angles)]
+
+
+def _refresh_lane_np(lane_id):
+    pts = points[lane_id]
+    points_np[lane_id] = np.array(pts, dtype=np.int32) if pts else None
+
+
+def mouse_callback(event, x, y, flags, param):
+    global points, current_lane, overlay_dirty
+    if event == cv2.EVENT_LBUTTONDOWN:
+        points[current_lane].append((x, y))
+        _refresh_lane_np(current_lane)
+        if annot_layer is not None:
+            _stamp_point(current_lane, (x, y), len(points[current_lane]))
+        overlay_dirty = True
+        print(f"[CALIB] Lane {current_lane}: point {len(points[current_lane])} = ({x}, {y})")
+
+
+def calibrate_lanes_from_video(video_path, out_path="lane_polygons.npz"):
+    """
+    Grab the first frame of the video and let the user click lane polygons.
+
+    Keys: n = next lane, r = reset current lane, s = save, q = quit.
+    """
+    global points, current_lane, overlay_dirty, annot_layer, annot_mask
+    cap = cv2.VideoCapture(video_path)
+    # Keep FFmpeg from pre-buffering frames we'll never read — we only
+    # need frame 0, so startup shouldn't decode ahead on long videos.
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    ret, img = cap.read()
+    cap.release()
+    if not ret:
+        print("[CALIB] Could not read first frame from:", video_path)
+        return None
+
+    h, w = img.shape[:2]
+    cv2.namedWindow(WINDOW)
+    cv2.setMouseCallback(WINDOW, mouse_callback)
+
+    # One preallocated display buffer reused for every rebuild — the
+    # clean path does no copying at all.
+    cached_display = np.empty_like(img)
+    annot_layer = np.zeros_like(img)
+    annot_mask = np.zeros(img.shape[:2], np.uint8)
+    overlay_dirty = True
+
+    while True:
+        # The preview only changes on click/key events, so the overlay is
+        # rebuilt lazily instead of re-drawing on every poll tick.
+        if overlay_dirty:
+            np.copyto(cached_display, img)
+            # Blend the pre-stamped circles/labels in one masked copy
+            cv2.copyTo(annot_layer, annot_mask, cached_display)
+
+            for lane_id, pts_np in points_np.items():
+                if pts_np is None or len(pts_np) < 3:
+                    continue
+                # For points clicked around the lane a simple angular
+                # sort gives the same outline as a convex hull
+                cv2.polylines(cached_display, [order_polygon(pts_np)],
+                              True, LANE_COLORS[lane_id], 2)
+
+            cv2.putText(cached_display,
+                        f"Lane {current_lane} | n=next r=reset s=save q=quit",
+                        (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            overlay_dirty = False
+
+        cv2.imshow(WINDOW, cached_display)
+
+        # pollKey returns immediately (waitKey(1) can block a full
+        # scheduler tick); sleep briefly when idle so the tool doesn't
+        # spin a core while waiting for clicks.
+        if hasattr(cv2, "pollKey"):
+            key = cv2.pollKey() & 0xFF
+        else:
+            key = cv2.waitKey(1) & 0xFF
+        if key == 255 and not overlay_dirty:
+            time.sleep(0.02)
+        if key == ord("n"):
+            current_lane = 2 if current_lane == 1 else 1
+            overlay_dirty = True
+            print(f"[CALIB] Now clicking lane {current_lane}")
+        elif key == ord("r"):
+            points[current_lane] = []
+            _refresh_lane_np(current_lane)
+            _rebuild_annotations()
+            overlay_dirty = True
+            print(f"[CALIB] Lane {current_lane} reset")
+        elif key == ord("s"):
+            save_lanes(out_path, w, h)
+            break
+        elif key == ord("q"):
+            break
+
+    cv2.destroyAllWindows()
+    return points
+
+
+def save_lanes(out_path, w, h):
+    """Write the clicked polygons plus frame size to disk as a compact
+    .npz — reload is a straight np.load with no JSON tokenizing."""
+    np.savez(out_path,
+             lane_1=np.array(points[1], np.int32),
+             lane_2=np.array(points[2], np.int32),
+             frame_size=np.array([w, h], np.int32))
+    # Build and cache the rasterized lane mask alongside the polygons so
+    # runtime consumers get O(1) lane lookup without re-rasterizing.
+    mask = build_lane_mask([points[1], points[2]], h, w)
+    np.save(_mask_path(out_path), mask)
+    print(f"[CALIB] Saved lane polygons to {out_path}")
+
+
+def _mask_path(path):
+    return os.path.splitext(path)[0] + "_mask.npy"
+
+
+def load_lanes(path="lane_polygons.npz"):
+    """
+    Load lane polygons saved by this tool. Returns int32 arrays ready
+    for cv2.fillPoly/polylines. Old JSON calibrations still load.
+    """
+    if path.endswith(".json"):
+        with open(path) as f:
+            data = json.load(f)
+    else:
+        with np.load(path) as npz:
+            data = {k: npz[k] for k in npz.files}
+    return {
+        "lane_1": np.asarray(data["lane_1"], np.int32),
+        "lane_2": np.asarray(data["lane_2"], np.int32),
+        "frame_size": np.asarray(data["frame_size"], np.int32),
+    }
+
+
+def load_lane_mask(path="lane_polygons.npz"):
+    """
+    Load the cached lane-index mask for a calibration, building (and
+    caching) it from the polygons if the sidecar file is missing.
+    """
+    mask_file = _mask_path(path)
+    if os.path.exists(mask_file):
+        return np.load(mask_file)
+
+    data = load_lanes(path)
+    w, h = data["frame_size"]
+    mask = build_lane_mask([data["lane_1"], data["lane_2"]], h, w)
+    np.save(mask_file, mask)
+    return mask
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate lane polygons from a video")
+    parser.add_argument("video", help="Path to a sample video of the junction")
+    parser.add_argument("--out", default="lane_polygons.npz", help="Output file")
+    args = parser.parse_args()
+    calibrate_lanes_from_video(args.video, args.out)
@@ -0,0 +1,18 @@
+"""
+Congestion Analysis Package
+Lane-level density and speed estimation for the SMC traffic module.
+"""
+from .density import (
+    VEHICLE_WEIGHTS,
+    compute_density,
+    compute_density_from_weights,
+    compute_density_polygon,
+    register_class_names,
+    CongestionDetector,
+)
+from .speed import compute_average_speed
+from .lane_geometry import (
+    build_lane_polygons,
+    point_in_polygon,
+    points_in_convex_polygon,
+)
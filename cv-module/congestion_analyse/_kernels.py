@@ -0,0 +1,148 @@
+"""
+Numba-compiled kernels for the density/speed hot path.
+For the typical 10-50 tracked objects per frame, LLVM-compiled loops
+over flat float32 arrays beat NumPy's temporary-array pipeline. Numba
+is optional — callers must check NUMBA_AVAILABLE before dispatching.
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """No-op decorator so the module still imports without numba."""
+        def wrap(func):
+            return func
+        if args and callable(args[0]):
+            return args[0]
+        return wrap
+
+
+@njit(cache=True, fastmath=True)
+def pnpoly_batch(cx, cy, poly_x, poly_y):
+    """Crossing-number test of all (cx, cy) points against one polygon."""
+    n = cx.shape[0]
+    k = poly_x.shape[0]
+    out = np.zeros(n, dtype=np.bool_)
+    for i in range(n):
+        inside = False
+        j = k - 1
+        for m in range(k):
+            if ((poly_y[m] > cy[i]) != (poly_y[j] > cy[i])) and \
+               (cx[i] < (poly_x[j] - poly_x[m]) * (cy[i] - poly_y[m]) /
+                    (poly_y[j] - poly_y[m] + 1e-12) + poly_x[m]):
+                inside = not inside
+            j = m
+        out[i] = inside
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def pip_single(px, py, poly_x, poly_y):
+    """Crossing-number test of one point against one polygon. Unlike the
+    half-plane path this handles non-convex polygons too."""
+    n = poly_x.shape[0]
+    inside = False
+    j = n - 1
+    for i in range(n):
+        if ((poly_y[i] > py) != (poly_y[j] > py)) and \
+           (px < (poly_x[j] - poly_x[i]) * (py - poly_y[i]) /
+                (poly_y[j] - poly_y[i] + 1e-12) + poly_x[i]):
+            inside = not inside
+        j = i
+    return inside
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def pip_batch_csr(poly_x, poly_y, starts, cx, cy):
+    """
+    Crossing-number test of all points against many polygons at once.
+    Polygons are packed CSR-style: vertices of polygon p live in
+    poly_x/poly_y[starts[p]:starts[p + 1]]. Returns an (N, P) bool mask.
+    """
+    n = cx.shape[0]
+    p_count = starts.shape[0] - 1
+    out = np.zeros((n, p_count), dtype=np.bool_)
+    for i in prange(n):
+        for p in range(p_count):
+            lo = starts[p]
+            hi = starts[p + 1]
+            inside = False
+            j = hi - 1
+            for m in range(lo, hi):
+                if ((poly_y[m] > cy[i]) != (poly_y[j] > cy[i])) and \
+                   (cx[i] < (poly_x[j] - poly_x[m]) * (cy[i] - poly_y[m]) /
+                        (poly_y[j] - poly_y[m] + 1e-12) + poly_x[m]):
+                    inside = not inside
+                j = m
+            out[i, p] = inside
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def occupancy_sum(inside, weights):
+    """Sum of weights where inside is set — no boolean-mask temporaries."""
+    total = 0.0
+    for i in range(inside.shape[0]):
+        if inside[i]:
+            total += weights[i]
+    return total
+
+
+@njit(cache=True, fastmath=True)
+def ols_predict(y, x_new):
+    """Closed-form least-squares line through (0..n-1, y) evaluated at
+    x_new — the whole fit is two accumulator passes."""
+    n = y.shape[0]
+    xm = (n - 1) * 0.5
+    ym = 0.0
+    for i in range(n):
+        ym += y[i]
+    ym /= n
+    num = 0.0
+    den = 0.0
+    for i in range(n):
+        dx = i - xm
+        num += dx * (y[i] - ym)
+        den += dx * dx
+    return ym + (num / den) * (x_new - xm)
+
+
+@njit(cache=True)
+def divider_x(xs, lo, hi, nbins):
+    """Center of the least-populated x-histogram bin in (lo, hi),
+    ignoring the outer quarters of the range. One pass over xs with a
+    local counts array — no np.histogram setup or bins allocation."""
+    bw = (hi - lo) / nbins
+    if bw <= 0.0:
+        return (lo + hi) * 0.5
+    counts = np.zeros(nbins, dtype=np.int64)
+    for i in range(xs.shape[0]):
+        b = int((xs[i] - lo) / bw)
+        if 0 <= b < nbins:
+            counts[b] += 1
+    start = nbins // 4
+    end = nbins - nbins // 4
+    best = start
+    for b in range(start, end):
+        if counts[b] < counts[best]:
+            best = b
+    return lo + (best + 0.5) * bw
+
+
+@njit(cache=True, fastmath=True)
+def mean_pair_distance(last_x, last_y, prev_x, prev_y):
+    """Mean Euclidean displacement between paired position arrays."""
+    n = last_x.shape[0]
+    if n == 0:
+        return 0.0
+    total = 0.0
+    for i in range(n):
+        dx = last_x[i] - prev_x[i]
+        dy = last_y[i] - prev_y[i]
+        total += (dx * dx + dy * dy) ** 0.5
+    return total / n
@@ -0,0 +1,330 @@
+"""
+Lane Density Computation for Congestion Analysis
+Counts weighted vehicle occupancy inside lane polygons / ROI and tracks
+a rolling congestion state over time.
+"""
+import cv2
+import numpy as np
+
+from . import _kernels
+from .roi import inside_roi_batch
+
+# Relative road space taken up by each vehicle class
+VEHICLE_WEIGHTS = {
+    "car": 1.0,
+    "truck": 1.5,
+    "bus": 1.5,
+    "motorbike": 0.5,
+    "bicycle": 0.3,
+}
+
+# Scores used by CongestionDetector (slow traffic counts toward congestion)
+DENSITY_SCORE = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+SPEED_SCORE = {"LOW": 2, "MEDIUM": 1, "HIGH": 0}
+
+# Weight table indexed by the detector's integer class id, filled in by
+# register_class_names so the per-frame path never touches strings.
+CLS_WEIGHT_BY_ID = None
+
+
+def register_class_names(names):
+    """
+    Intern the detector's class-name table once so density lookups can
+    index a float32 array by the integer class id instead of lowering
+    and hashing a string per object per frame.
+
+    Args:
+        names: dict class_id -> class_name (e.g. YOLO model.names)
+    """
+    global CLS_WEIGHT_BY_ID
+    table = np.zeros(max(names) + 1, dtype=np.float32)
+    for cls_id, name in names.items():
+        table[cls_id] = VEHICLE_WEIGHTS.get(str(name).lower(), 0.0)
+    CLS_WEIGHT_BY_ID = table
+
+
+def _object_weight(obj):
+    """Lookup the density weight for a tracked object by class name."""
+    name = str(obj.get("cls_name") or obj.get("cls") or "").lower()
+    return VEHICLE_WEIGHTS.get(name, 0.0)
+
+
+def _weights_for(tracked_objects):
+    """Per-object weight array, using the interned id table when the
+    detector registered its class names (falls back to string lookup)."""
+    if CLS_WEIGHT_BY_ID is not None and \
+            isinstance(tracked_objects[0].get("cls"), (int, np.integer)):
+        ids = np.fromiter((o["cls"] for o in tracked_objects),
+                          dtype=np.int64, count=len(tracked_objects))
+        return CLS_WEIGHT_BY_ID[np.clip(ids, 0, CLS_WEIGHT_BY_ID.size - 1)]
+    return np.array([_object_weight(o) for o in tracked_objects],
+                    dtype=np.float32)
+
+
+def _centers_from_objects(tracked_objects):
+    """Stack all bbox centers into (N,) cx / cy float32 arrays."""
+    bboxes = np.array([o["bbox"] for o in tracked_objects], dtype=np.float32)
+    cx = (bboxes[:, 0] + bboxes[:, 2]) * 0.5
+    cy = (bboxes[:, 1] + bboxes[:, 3]) * 0.5
+    return cx, cy
+
+
+def _points_in_quad(cx, cy, poly):
+    """
+    Unrolled crossing-number test for 4-vertex polygons (the common case
+    for lane trapezoids). Same PNPOLY logic as _points_in_polygon with the
+    edge loop unrolled.
+    """
+    inside = np.zeros(cx.shape[0], dtype=bool)
+    for i in range(4):
+        x1, y1 = poly[i]
+        x2, y2 = poly[(i + 1) % 4]
+        cond = ((y1 > cy) != (y2 > cy)) & \
+               (cx < (x2 - x1) * (cy - y1) / (y2 - y1 + 1e-12) + x1)
+        inside ^= cond
+    return inside
+
+
+def _points_in_polygon(cx, cy, poly):
+    """
+    Vectorized PNPOLY (crossing-number) test of all points against all
+    polygon edges in one shot — no per-point cv2 calls.
+    """
+    v1 = poly
+    v2 = np.roll(poly, -1, axis=0)
+    cond = ((v1[:, 1] > cy[:, None]) != (v2[:, 1] > cy[:, None])) & \
+           (cx[:, None] < (v2[:, 0] - v1[:, 0]) *
+            (cy[:, None] - v1[:, 1]) / (v2[:, 1] - v1[:, 1] + 1e-12) + v1[:, 0])
+    return cond.sum(axis=1) % 2 == 1
+
+
+# Branchless level classification: searchsorted maps a ratio straight
+# to an index into DENSITY_LEVELS ("right" keeps the >= semantics).
+DENSITY_LEVELS = ("LOW", "MEDIUM", "HIGH")
+DENSITY_THRESHOLDS = np.array([0.4, 0.7])
+
+
+def _density_level(density_ratio):
+    return DENSITY_LEVELS[int(np.searchsorted(DENSITY_THRESHOLDS,
+                                              density_ratio, side="right"))]
+
+
+# Bit layout of the rasterized mask: bit 0 = inside ROI, bit n = lane n.
+# One uint8 read per vehicle answers both "in ROI?" and "which lane?".
+ROI_BIT = 1
+
+
+def lane_bit(lane_id):
+    """Mask bit for a 1-based lane index."""
+    return 1 << lane_id
+
+
+def build_lane_mask(lane_polygons, h, w, roi=None):
+    """
+    Rasterize static lane polygons (and optionally the rectangular ROI)
+    into a single (H, W) uint8 bitmask. Built once per calibration;
+    every later spatial query is a single array lookup.
+
+    Args:
+        lane_polygons: list of polygons, each a list of (x, y) vertices
+        h, w: frame height and width
+        roi: optional (rx1, ry1, rx2, ry2) rectangle stored in ROI_BIT
+
+    Returns:
+        np.ndarray: (H, W) uint8 bitmask (bit 0 = ROI, bit n = lane n)
+    """
+    mask = np.zeros((h, w), np.uint8)
+    layer = np.empty((h, w), np.uint8)
+    for i, poly in enumerate(lane_polygons):
+        layer[:] = 0
+        cv2.fillPoly(layer, [np.asarray(poly, np.int32)],
+                     color=int(lane_bit(i + 1)))
+        mask |= layer
+    if roi is not None:
+        rx1, ry1, rx2, ry2 = roi
+        mask[max(ry1, 0):ry2, max(rx1, 0):rx2] |= ROI_BIT
+    return mask
+
+
+def compute_density_mask(tracked_objects, lane_mask, lane_id,
+                         lane_capacity=10.0):
+    """
+    Same as compute_density_polygon but classifies bbox centers via a
+    precomputed lane-index mask — O(1) per vehicle, no polygon tests.
+
+    Args:
+        tracked_objects: list of tracked vehicles from the detector
+        lane_mask: (H, W) uint8 mask from build_lane_mask
+        lane_id: lane index to count (1-based, as stored in the mask)
+        lane_capacity: weighted vehicle count considered "full"
+
+    Returns:
+        dict: occupancy, density_ratio and density_level
+    """
+    if not tracked_objects:
+        return {"occupancy": 0.0, "density_ratio": 0.0, "density_level": "LOW"}
+
+    h, w = lane_mask.shape[:2]
+    cx, cy = _centers_from_objects(tracked_objects)
+    ix = np.clip(cx.astype(np.int32), 0, w - 1)
+    iy = np.clip(cy.astype(np.int32), 0, h - 1)
+    inside = (lane_mask[iy, ix] & lane_bit(lane_id)) != 0
+
+    weights = _weights_for(tracked_objects)
+    occupancy = float(weights[inside].sum())
+
+    density_ratio = min(occupancy / lane_capacity, 1.0)
+    return {
+        "occupancy": occupancy,
+        "density_ratio": density_ratio,
+        "density_level": _density_level(density_ratio),
+    }
+
+
+def compute_density(tracked_objects, roi, lane_capacity=10.0):
+    """
+    Weighted density of vehicles whose bbox center lies inside a
+    rectangular ROI.
+
+    Args:
+        tracked_objects: list of tracked vehicles from the detector
+        roi: (rx1, ry1, rx2, ry2) rectangle
+        lane_capacity: weighted vehicle count considered "full"
+
+    Returns:
+        dict: occupancy, density_ratio and density_level
+    """
+    if not tracked_objects:
+        return {"occupancy": 0.0, "density_ratio": 0.0, "density_level": "LOW"}
+
+    bboxes = np.asarray([o["bbox"] for o in tracked_objects],
+                        dtype=np.float32)
+    mask = inside_roi_batch(bboxes, roi)
+    occupancy = float(_weights_for(tracked_objects)[mask].sum())
+
+    density_ratio = min(occupancy / lane_capacity, 1.0)
+    return {
+        "occupancy": occupancy,
+        "density_ratio": density_ratio,
+        "density_level": _density_level(density_ratio),
+    }
+
+
+def compute_density_from_weights(weights, lane_capacity=10.0):
+    """
+    Density summary from an already-gathered per-vehicle weight array.
+    For SoA callers that keep detections as flat arrays and partition
+    them into lanes themselves — no dicts, no polygon test here.
+
+    Args:
+        weights: (N,) array of class weights for the vehicles in a lane
+        lane_capacity: weighted vehicle count considered "full"
+
+    Returns:
+        dict: occupancy, density_ratio and density_level
+    """
+    occupancy = float(weights.sum()) if weights.size else 0.0
+    density_ratio = min(occupancy / lane_capacity, 1.0)
+    return {
+        "occupancy": occupancy,
+        "density_ratio": density_ratio,
+        "density_level": _density_level(density_ratio),
+    }
+
+
+def compute_density_polygon(tracked_objects, lane_polygon, lane_capacity=10.0):
+    """
+    Weighted density of vehicles whose bbox center lies inside a lane
+    polygon. All centers are tested against the polygon in a single
+    batched NumPy crossing-number pass.
+
+    Args:
+        tracked_objects: list of tracked vehicles from the detector
+        lane_polygon: list of (x, y) polygon vertices
+        lane_capacity: weighted vehicle count considered "full"
+
+    Returns:
+        dict: occupancy, density_ratio and density_level
+    """
+    if not tracked_objects:
+        return {"occupancy": 0.0, "density_ratio": 0.0, "density_level": "LOW"}
+
+    # The calibration loader already hands back contiguous int32 arrays;
+    # asarray passes those straight through instead of reallocating a
+    # fresh polygon copy on every frame.
+    poly = np.asarray(lane_polygon)
+    if poly.dtype not in (np.float32, np.int32):
+        poly = np.ascontiguousarray(poly, dtype=np.float32)
+    cx, cy = _centers_from_objects(tracked_objects)
+    weights = _weights_for(tracked_objects)
+
+    if _kernels.NUMBA_AVAILABLE:
+        # Allocation-free compiled loop wins for the usual small N
+        inside = _kernels.pnpoly_batch(cx, cy,
+                                       np.ascontiguousarray(poly[:, 0]),
+                                       np.ascontiguousarray(poly[:, 1]))
+        occupancy = float(_kernels.occupancy_sum(inside, weights))
+    else:
+        if poly.shape[0] == 4:
+            inside = _points_in_quad(cx, cy, poly)
+        else:
+            inside = _points_in_polygon(cx, cy, poly)
+        occupancy = float(weights[inside].sum())
+
+    density_ratio = min(occupancy / lane_capacity, 1.0)
+    return {
+        "occupancy": occupancy,
+        "density_ratio": density_ratio,
+        "density_level": _density_level(density_ratio),
+    }
+
+
+class CongestionDetector:
+    """
+    Rolls per-frame density/speed levels into a stable congestion state
+    over a sliding window, so a single noisy frame doesn't flip the state.
+    """
+
+    def __init__(self, window_size=15):
+        self.window_size = window_size
+        # Fixed int8 ring buffers instead of deques of boxed Python ints;
+        # running sums keep get_state O(1) with zero allocations.
+        self._dbuf = np.zeros(window_size, np.int8)
+        self._sbuf = np.zeros(window_size, np.int8)
+        self._head = 0
+        self._len = 0
+        self._d_sum = 0
+        self._s_sum = 0
+
+    def update(self, density_level, speed_level="HIGH"):
+        d_score = DENSITY_SCORE.get(density_level, 0)
+        s_score = SPEED_SCORE.get(speed_level, 0)
+        if self._len == self.window_size:
+            # overwrite the oldest slot, dropping it from the sums
+            self._d_sum -= int(self._dbuf[self._head])
+            self._s_sum -= int(self._sbuf[self._head])
+        else:
+            self._len += 1
+        self._dbuf[self._head] = d_score
+        self._sbuf[self._head] = s_score
+        self._head = (self._head + 1) % self.window_size
+        self._d_sum += d_score
+        self._s_sum += s_score
+
+    def get_state(self):
+        """
+        Returns:
+            str: "FREE_FLOW", "SLOW" or "CONGESTED"
+        """
+        if self._len == 0:
+            return "FREE_FLOW"
+
+        avg_density = self._d_sum / self._len
+        avg_speed = self._s_sum / self._len
+        score = avg_density + avg_speed
+
+        if score >= 3.0:
+            return "CONGESTED"
+        elif score >= 1.5:
+            return "SLOW"
+        return "FREE_FLOW"
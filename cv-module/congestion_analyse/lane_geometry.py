@@ -0,0 +1,171 @@
+"""
+Lane Geometry Helpers
+Builds lane polygons from a road ROI and tests points against them.
+Lane polygons are convex trapezoids, so membership reduces to a few
+half-plane dot products instead of a generic ray-cast.
+"""
+import numpy as np
+
+from . import _kernels
+
+# Horizontal inset of the top edge of each lane trapezoid (perspective)
+LANE_SLANT_PX = 40
+
+# Edge normals are fixed per polygon, so cache them keyed by the
+# polygon's vertices. Identity (id()) is not a safe key here: estimated
+# geometries come and go, and a recycled object id would silently hand
+# back the normals of an old polygon. Content keys cost a small tuple
+# build but can never alias.
+_CACHE_LIMIT = 64
+_normals_cache = {}
+
+
+def _poly_key(poly):
+    return tuple(map(tuple, poly))
+
+
+def build_lane_polygons(road_roi, divider_x, slant=LANE_SLANT_PX):
+    """
+    Split a road ROI into two lane trapezoids at divider_x.
+
+    Args:
+        road_roi: (x1, y1, x2, y2) road bounding box
+        divider_x: x position of the lane divider
+        slant: top-edge inset in pixels (parallel top/bottom edges)
+
+    Returns:
+        (lane1_poly, lane2_poly): lists of 4 (x, y) vertices each
+    """
+    x1, y1, x2, y2 = road_roi
+    lane1_poly = [(x1 + slant, y1), (divider_x, y1),
+                  (divider_x, y2), (x1, y2)]
+    lane2_poly = [(divider_x, y1), (x2 - slant, y1),
+                  (x2, y2), (divider_x, y2)]
+    return lane1_poly, lane2_poly
+
+
+def in_trapezoid(cx, cy, poly):
+    """
+    Membership test specialized for the trapezoids that
+    build_lane_polygons produces (horizontal top/bottom edges, vertices
+    ordered top-left, top-right, bottom-right, bottom-left): two linear
+    interpolations of the slanted side edges and a compare.
+
+    Args:
+        cx, cy: point coordinates (scalars)
+        poly: 4-vertex trapezoid from build_lane_polygons
+
+    Returns:
+        bool: True if the point is inside the trapezoid
+    """
+    (tlx, y1), (trx, _), (brx, y2), (blx, _) = poly
+    if not (y1 <= cy <= y2):
+        return False
+    t = (cy - y1) / (y2 - y1)
+    left = tlx + t * (blx - tlx)
+    right = trx + t * (brx - trx)
+    return left <= cx <= right
+
+
+def in_trapezoid_batch(cx, cy, poly):
+    """
+    Vectorized in_trapezoid over (N,) coordinate arrays — two FMAs and
+    four compares per point, no edge loop.
+
+    Args:
+        cx, cy: (N,) coordinate arrays
+        poly: 4-vertex trapezoid from build_lane_polygons
+
+    Returns:
+        np.ndarray: (N,) boolean mask
+    """
+    (tlx, y1), (trx, _), (brx, y2), (blx, _) = poly
+    t = (cy - y1) / (y2 - y1)
+    left = tlx + t * (blx - tlx)
+    right = trx + t * (brx - trx)
+    return (cx >= left) & (cx <= right) & (cy >= y1) & (cy <= y2)
+
+
+def _convex_edges(poly):
+    """Return (vertices, inward edge normals) for a convex polygon,
+    computed once per polygon object and cached."""
+    key = _poly_key(poly)
+    cached = _normals_cache.get(key)
+    if cached is not None:
+        return cached
+    if len(_normals_cache) >= _CACHE_LIMIT:
+        _normals_cache.clear()
+
+    v1 = np.asarray(poly, dtype=np.float32)
+    v2 = np.roll(v1, -1, axis=0)
+    edges = v2 - v1
+    normals = np.stack([-edges[:, 1], edges[:, 0]], axis=1)
+    # Flip any normal pointing away from the centroid so all point inward
+    center = v1.mean(axis=0)
+    outward = ((center - v1) * normals).sum(axis=1) < 0
+    normals[outward] *= -1
+
+    _normals_cache[key] = (v1, normals)
+    return v1, normals
+
+
+# Flat coordinate arrays for the compiled ray-cast, content-keyed and
+# bounded like the normals cache above.
+_pip_arrays = {}
+
+
+def _poly_arrays(poly):
+    key = _poly_key(poly)
+    cached = _pip_arrays.get(key)
+    if cached is None:
+        if len(_pip_arrays) >= _CACHE_LIMIT:
+            _pip_arrays.clear()
+        v = np.asarray(poly, dtype=np.float64)
+        cached = _pip_arrays[key] = (np.ascontiguousarray(v[:, 0]),
+                                     np.ascontiguousarray(v[:, 1]))
+    return cached
+
+
+def point_in_polygon(pt, poly):
+    """
+    Single-point membership test — no cv2 FFI call. With numba this is
+    a compiled scalar ray-cast over cached flat coordinate arrays (and
+    then also works for non-convex polygons); otherwise it falls back
+    to the convex half-plane tests.
+
+    Args:
+        pt: (x, y) point
+        poly: polygon as a list of (x, y) vertices (convex required
+            only on the fallback path)
+
+    Returns:
+        bool: True if the point is inside (or on) the polygon
+    """
+    if _kernels.NUMBA_AVAILABLE:
+        poly_x, poly_y = _poly_arrays(poly)
+        return bool(_kernels.pip_single(float(pt[0]), float(pt[1]),
+                                        poly_x, poly_y))
+    v1, normals = _convex_edges(poly)
+    d = (np.asarray(pt, dtype=np.float32) - v1)
+    return bool(np.all((d * normals).sum(axis=1) >= 0))
+
+
+def points_in_convex_polygon(pts, poly):
+    """
+    Batched membership mask for many points against one convex polygon:
+    a single (N, K) matmul against the precomputed edge normals.
+
+    Args:
+        pts: (N, 2) array of points
+        poly: convex polygon as a list of (x, y) vertices
+
+    Returns:
+        np.ndarray: (N,) boolean mask
+    """
+    v1, normals = _convex_edges(poly)
+    pts = np.asarray(pts, dtype=np.float32)
+    if pts.size == 0:
+        return np.zeros(0, dtype=bool)
+    # (N,K) signed distances to each edge's half-plane
+    signed = pts @ normals.T - (v1 * normals).sum(axis=1)
+    return np.all(signed >= 0, axis=1)
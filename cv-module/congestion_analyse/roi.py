@@ -0,0 +1,39 @@
+"""
+ROI helpers for congestion analysis.
+The ROI is a simple axis-aligned rectangle (x1, y1, x2, y2) in pixels.
+"""
+import numpy as np
+
+
+def inside_roi_batch(bboxes, roi):
+    """
+    Test all bbox centers against the ROI in one vectorized pass.
+
+    Args:
+        bboxes: (N, 4) array of (x1, y1, x2, y2) boxes
+        roi: (rx1, ry1, rx2, ry2) region of interest
+
+    Returns:
+        np.ndarray: (N,) boolean mask of centers inside the ROI
+    """
+    rx1, ry1, rx2, ry2 = roi
+    cx = (bboxes[:, 0] + bboxes[:, 2]) * 0.5
+    cy = (bboxes[:, 1] + bboxes[:, 3]) * 0.5
+    return (rx1 <= cx) & (cx <= rx2) & (ry1 <= cy) & (cy <= ry2)
+
+
+def is_inside_roi(bbox, roi):
+    """
+    Check if a bbox center falls inside the rectangular ROI.
+
+    Args:
+        bbox: (x1, y1, x2, y2) of the tracked vehicle
+        roi: (rx1, ry1, rx2, ry2) region of interest
+
+    Returns:
+        bool: True if the bbox center is inside the ROI
+    """
+    rx1, ry1, rx2, ry2 = roi
+    cx = (bbox[0] + bbox[2]) * 0.5
+    cy = (bbox[1] + bbox[3]) * 0.5
+    return rx1 <= cx <= rx2 and ry1 <= cy <= ry2
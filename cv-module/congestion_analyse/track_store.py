@@ -0,0 +1,71 @@
+"""
+SoA position storage for tracked vehicles.
+Keeps every track's recent (x, y) positions in one preallocated
+float32 ring buffer instead of per-track Python lists of tuples, so
+whole-frame computations (speed, lane assignment) run as array slices
+with no Python-level iteration.
+"""
+import numpy as np
+
+
+class TrackPositionStore:
+    """
+    Fixed-capacity (max_tracks, history_len, 2) position buffer with a
+    per-track write head. Rows are recycled when tracks are released.
+    """
+
+    def __init__(self, max_tracks=256, history_len=16):
+        self.history_len = history_len
+        self.positions_xy = np.zeros((max_tracks, history_len, 2),
+                                     dtype=np.float32)
+        self.head_idx = np.zeros(max_tracks, dtype=np.int32)
+        self.counts = np.zeros(max_tracks, dtype=np.int32)
+        self._row_of = {}
+        self._free = list(range(max_tracks - 1, -1, -1))
+
+    def append(self, track_id, x, y):
+        """Record the latest position for a track (allocating a row on
+        first sight). Silently drops the sample if capacity is full."""
+        row = self._row_of.get(track_id)
+        if row is None:
+            if not self._free:
+                return
+            row = self._free.pop()
+            self._row_of[track_id] = row
+            self.head_idx[row] = -1
+            self.counts[row] = 0
+        head = (self.head_idx[row] + 1) % self.history_len
+        self.positions_xy[row, head] = (x, y)
+        self.head_idx[row] = head
+        self.counts[row] += 1
+
+    def release(self, track_id):
+        """Free a row once the tracker drops the id."""
+        row = self._row_of.pop(track_id, None)
+        if row is not None:
+            self.counts[row] = 0
+            self._free.append(row)
+
+    def active_rows(self, min_points=2):
+        """Row indices of tracks with at least min_points positions."""
+        rows = np.fromiter(self._row_of.values(), dtype=np.int32,
+                           count=len(self._row_of))
+        if rows.size == 0:
+            return rows
+        return rows[self.counts[rows] >= min_points]
+
+    def last_prev(self, rows=None):
+        """
+        Return (last, prev) position arrays of shape (K, 2) for the given
+        rows (default: all active tracks with >= 2 points) — two fancy
+        index reads, no per-track work.
+        """
+        if rows is None:
+            rows = self.active_rows(min_points=2)
+        if rows.size == 0:
+            empty = np.empty((0, 2), dtype=np.float32)
+            return empty, empty
+        heads = self.head_idx[rows]
+        last = self.positions_xy[rows, heads]
+        prev = self.positions_xy[rows, (heads - 1) % self.history_len]
+        return last, prev
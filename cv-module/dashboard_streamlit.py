@@ -1,5 +1,6 @@
 import streamlit as st
-import cv2, time, tempfile, os, sys
+import cv2, time, tempfile, os, sys, shutil
+import threading, queue
 import numpy as np
 import pandas as pd
 
@@ -11,7 +12,14 @@ except ImportError:
     DETECTOR_AVAILABLE = False
     st.warning("⚠️ Detector module not available. Install ultralytics: `pip install ultralytics`")
 
-from db import insert_violation, insert_report, get_density_history, get_latest_parking
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+from db import (insert_violation_buffered, flush_violations, insert_report,
+                get_density_history, get_latest_parking)
 from predictive_layer import predict_traffic_trend
 import plotly.express as px
 import pydeck as pdk
@@ -32,6 +40,88 @@ TRAFFIC_CLASSES = {
     "person", "traffic light", "stop sign", "train"
 }
 
+VIOLATION_TYPES = (
+    "no_helmet", "signal_break", "overspeed", "wrong_way",
+    "triple_riding", "track_crossing", "illegal_parking", "congestion",
+)
+
+# Sidebar markdown per violation type, built once instead of uppercasing
+# and re-assembling the f-string for every violation in the hot loop
+VIOLATION_TEMPLATES = {
+    vt: f"**{vt.upper()}** — {{cls}} (plate {{plate}})"
+    for vt in VIOLATION_TYPES
+}
+
+class PyAVCapture:
+    """cv2.VideoCapture-style wrapper over PyAV file decoding. PyAV
+    releases the GIL per frame (thread_type=SLICE), so the reader thread
+    actually overlaps with inference, unlike cv2's grab/retrieve."""
+
+    def __init__(self, path):
+        # A corrupt upload raises out of av.open; record the failure so
+        # isOpened() degrades the same way cv2.VideoCapture does instead
+        # of blowing a traceback through the UI
+        self.container = None
+        self._frames = iter(())
+        try:
+            self.container = av.open(path)
+            self.stream = self.container.streams.video[0]
+            self.stream.thread_type = "SLICE"
+            self._frames = self.container.decode(self.stream)
+        except Exception:
+            self.release()
+            self.container = None
+
+    def isOpened(self):
+        return self.container is not None
+
+    def read(self):
+        try:
+            frame = next(self._frames)
+            return True, frame.to_ndarray(format="bgr24")
+        except StopIteration:
+            return False, None
+        except Exception:
+            return False, None
+
+    def get(self, prop):
+        if self.container is not None and prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0.0)
+        return 0.0
+
+    def release(self):
+        try:
+            self.container.close()
+        except Exception:
+            pass
+
+
+# Snapshots are written off the detection loop: the hot path just drops
+# (path, frame) on a queue and a daemon thread pays the JPEG encode +
+# disk cost. cache_resource keeps one queue + writer thread alive across
+# Streamlit reruns — this script re-executes on every widget click, and
+# a fresh thread per rerun would orphan the old queue along with any
+# snapshots still pending on it.
+@st.cache_resource
+def _get_snapshot_queue():
+    q = queue.Queue()
+
+    def _snapshot_writer():
+        while True:
+            path, frame = q.get()
+            try:
+                cv2.imwrite(path, frame)
+            except Exception:
+                pass
+            q.task_done()
+
+    threading.Thread(target=_snapshot_writer, daemon=True).start()
+    return q
+
+
+snapshot_q = _get_snapshot_queue()
+
+
 def classify_content(detected_classes):
     """Classify frame content"""
     if not detected_classes:
@@ -51,6 +141,18 @@ if "violations_log" not in st.session_state:
 # ---------------------------
 # Streamlit UI
 # ---------------------------
+# DB reads run on every Streamlit rerun (tab switch, widget click);
+# a short TTL keeps Mongo off the interactive path.
+@st.cache_data(ttl=5)
+def _cached_density(limit):
+    return get_density_history(limit=limit)
+
+
+@st.cache_data(ttl=5)
+def _cached_parking():
+    return get_latest_parking()
+
+
 st.set_page_config(page_title="SMC Smart Traffic & Parking", layout="wide")
 st.title("🏛 Solapur Municipal Corporation (SMC) Command Center")
 
@@ -60,8 +162,12 @@ with tab2:
     st.header("📈 City-Wide Congestion Analytics")
     col1, col2, col3 = st.columns(3)
     
+    if st.button("🔄 Refresh Data"):
+        _cached_density.clear()
+        _cached_parking.clear()
+
     # Mock Data/Live Data from DB
-    density_data = get_density_history(limit=50)
+    density_data = _cached_density(limit=50)
     prediction = predict_traffic_trend()
 
     if density_data:
@@ -122,7 +228,7 @@ with tab2:
 
 with tab3:
     st.header("🅿️ Smart Parking Management")
-    parking_data = get_latest_parking()
+    parking_data = _cached_parking()
     
     # Use mock data if database is empty
     if not parking_data:
@@ -210,7 +316,7 @@ with tab1:
 
         filter_type = st.sidebar.selectbox(
             "Filter Violations",
-            ["All", "no_helmet", "signal_break", "overspeed", "wrong_way", "triple_riding", "track_crossing", "illegal_parking", "congestion"]
+            ["All", *VIOLATION_TYPES]
         )
 
         # Placeholders
@@ -232,9 +338,19 @@ with tab1:
                         st.session_state.running = False
                     else:
                         tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
+                        # Stream the upload to disk in 1 MiB chunks —
+                        # video_file.read() buffered the whole clip in
+                        # memory a second time before writing it out
                         with open(tmp_file, "wb") as f:
-                            f.write(video_file.read())
-                        cap = cv2.VideoCapture(tmp_file)
+                            shutil.copyfileobj(video_file, f, length=1 << 20)
+                        if PYAV_AVAILABLE:
+                            cap = PyAVCapture(tmp_file)
+                            if not cap.isOpened():
+                                # PyAV couldn't parse it; give cv2 a shot
+                                # before declaring the upload unreadable
+                                cap = cv2.VideoCapture(tmp_file)
+                        else:
+                            cap = cv2.VideoCapture(tmp_file)
                         if not cap.isOpened():
                             st.error("Couldn't open uploaded video.")
                             st.session_state.running = False
@@ -244,9 +360,17 @@ with tab1:
                         st.error("Please upload an image file to start detection.")
                         st.session_state.running = False
                     else:
-                        # Process single image
+                        # Process single image. Big uploads (phone photos)
+                        # decode at half/quarter resolution — the 640-input
+                        # detector throws the extra pixels away anyway.
                         file_bytes = np.asarray(bytearray(image_file.read()), dtype=np.uint8)
-                        frame = cv2.imdecode(file_bytes, 1)
+                        if file_bytes.size > 8 << 20:
+                            decode_flag = cv2.IMREAD_REDUCED_COLOR_4
+                        elif file_bytes.size > 2 << 20:
+                            decode_flag = cv2.IMREAD_REDUCED_COLOR_2
+                        else:
+                            decode_flag = cv2.IMREAD_COLOR
+                        frame = cv2.imdecode(file_bytes, decode_flag)
                         annotated, dets, tracked_list, violations, tl_state = detector.detect_frame(frame)
                         annotated_rgb = cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB)
                         stframe.image(annotated_rgb, channels="RGB", use_container_width=True)
@@ -258,93 +382,246 @@ with tab1:
 
                         st.session_state.running = False  # run once for image
 
-            # Detection Loop for webcam/video
-            while st.session_state.running and cap and cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
+            # Detection Loop for webcam/video.
+            # Decode runs on its own thread so H.264 reads overlap GPU
+            # inference; the bounded queue gives back-pressure.
+            BATCH_SIZE = 8
+            DETECT_WIDTH = 640  # YOLOv8n letterboxes to 640 anyway
+            stop_event = threading.Event()
+            read_q = queue.Queue(maxsize=16)
+
+            def _put_checked(q, stop, item):
+                """put() that re-checks the stop event while the queue is
+                full, so a reader with no consumer left can still exit."""
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.25)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+
+            def _reader(src, q, stop):
+                while not stop.is_set():
+                    ok, frm = src.read()
+                    if not ok:
+                        break
+                    h, w = frm.shape[:2]
+                    if w > DETECT_WIDTH:
+                        # Resize once in BGR on the reader thread — the
+                        # detector would downsample to 640 internally, but
+                        # at 1080p everything downstream (annotation, RGB
+                        # convert, snapshots) moves ~9x less memory.
+                        frm = cv2.resize(
+                            frm, (DETECT_WIDTH, round(h * DETECT_WIDTH / w)),
+                            interpolation=cv2.INTER_LINEAR)
+                    if not _put_checked(q, stop, frm):
+                        return
+                _put_checked(q, stop, None)  # end-of-stream marker
+
+            reader_t = None
+            if st.session_state.running and cap:
+                reader_t = threading.Thread(target=_reader,
+                                            args=(cap, read_q, stop_event),
+                                            daemon=True)
+                reader_t.start()
+
+            # Frame-difference gate: when a tiny gray thumbnail barely
+            # changes between frames (static camera, idle junction), the
+            # previous detection results are reused instead of running
+            # YOLO again. A forced detection every GATE_RESET frames
+            # keeps tracks from going stale.
+            DIFF_THRESHOLD = 2.0
+            GATE_RESET = 30
+            prev_thumb = None
+            last_result = None
+            gated_streak = 0
+
+            # Deadline pacer: display at the source frame rate instead of
+            # a fixed sleep(0.1), which capped everything at 10 FPS no
+            # matter how fast detection ran. Webcams report FPS as 0 and
+            # already block in read(), so they pace against 30 Hz.
+            src_fps = cap.get(cv2.CAP_PROP_FPS) if cap else 0.0
+            target_dt = 1.0 / src_fps if src_fps and src_fps > 0 else 1.0 / 30.0
+            next_t = time.perf_counter()
+
+            eos = False
+            while st.session_state.running and cap and not eos:
+                # Drain what's already decoded, up to one batch
+                frames = []
+                while len(frames) < BATCH_SIZE:
+                    try:
+                        item = read_q.get(timeout=5) if not frames else read_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        eos = True
+                        break
+                    frames.append(item)
+                if not frames:
                     st.warning("Video finished or invalid frame.")
                     st.session_state.running = False
                     break
 
-                # Run detector
-                annotated, dets, tracked_list, violations, tl_state = detector.detect_frame(frame)
-
-                # Content filter
-                detected_classes = {d.get("cls_name", "unknown") for d in dets}
-                content_type = classify_content(detected_classes)
-                if content_type in ["invalid", "unclear"]:
-                    continue
-
-                # Show video
-                annotated_rgb = cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB)
-                stframe.image(annotated_rgb, channels="RGB", use_container_width=True)
-
-                # ---------------------------
-                # Process Violations
-                # ---------------------------
-                if violations:
-                    for v in violations:
-                        vtype = v.get("type", "unknown")
-                        plate = v.get("plate", "NOT_DETECTED")
-                        tid = v.get("track_id", -1)
-
-                        # 🔹 Snapshot save
-                        os.makedirs("snapshots", exist_ok=True)
-                        snapshot_name = f"snapshots/{time.strftime('%Y%m%d_%H%M%S')}_tid{tid}_{vtype}.jpg"
-                        cv2.imwrite(snapshot_name, annotated)  # save annotated frame
-
-                        # Save to MongoDB with snapshot_path
-                        record = {
-                            "vehicle_no": plate,
-                            "violation_type": vtype,
-                            "track_id": tid,
-                            "cls": v.get("cls_name", "unknown"),
-                            "conf": float(v.get("conf", 0.0)),
-                            "speed_kmph": v.get("speed_kmph"),
-                            "reason": v.get("reason", ""),
-                            "tl_state": v.get("tl_state", tl_state),
-                            "snapshot_path": snapshot_name,
-                            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                        }
-                        try:
-                            insert_violation(record)
-                        except Exception as e:
-                            st.sidebar.error(f"DB Insert Error: {e}")
-
-                        # Append to session log
-                        st.session_state.violations_log.append({
-                            "Time": record["timestamp"],
-                            "Violation": vtype,
-                            "Plate": plate,
-                            "Track ID": tid,
-                            "Confidence": round(record["conf"], 2),
-                            "Speed": record["speed_kmph"],
-                            "Snapshot": snapshot_name,
-                        })
-
-                        violation_container.markdown(
-                            f"**{vtype.UPPER()}** — {v.get('cls_name','?')} (plate {plate})"
-                        )
-                        violation_container.image(
-                            cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB),
-                            caption=f"Violation: {vtype} | Plate: {plate}",
-                            use_container_width=True
-                        )
-
-                    # Table update
-                    if st.session_state.violations_log:
-                        df = pd.DataFrame(st.session_state.violations_log)
-                        if filter_type != "All":
-                            df = df[df["Violation"] == filter_type]
-                        table_placeholder.dataframe(df, use_container_width=True)
-
-                time.sleep(0.1)
+                to_detect, slots = [], []
+                batch_results = [None] * len(frames)
+                for i, frm in enumerate(frames):
+                    thumb = cv2.resize(
+                        cv2.cvtColor(frm, cv2.COLOR_BGR2GRAY), (64, 36))
+                    if (prev_thumb is not None and last_result is not None
+                            and gated_streak < GATE_RESET
+                            and cv2.absdiff(prev_thumb, thumb).mean() < DIFF_THRESHOLD):
+                        batch_results[i] = last_result
+                        gated_streak += 1
+                    else:
+                        to_detect.append(frm)
+                        slots.append(i)
+                        gated_streak = 0
+                    prev_thumb = thumb
+                if to_detect:
+                    for i, res in zip(slots, detector.detect_batch(to_detect)):
+                        batch_results[i] = res
+                        # Reused results are for display only: replaying
+                        # the violations of the detected frame on every
+                        # gated frame would duplicate DB inserts,
+                        # snapshots and log rows behind the rule engine's
+                        # cooldown, so the cached copy carries none.
+                        annotated, dets, tracked_list, _, tl_state = res
+                        last_result = (annotated, dets, tracked_list, [],
+                                       tl_state)
+                for annotated, dets, tracked_list, violations, tl_state in batch_results:
+
+                    # Content filter
+                    detected_classes = {d.get("cls_name", "unknown") for d in dets}
+                    content_type = classify_content(detected_classes)
+                    if content_type in ["invalid", "unclear"]:
+                        continue
+
+                    # Show video. One persistent RGB buffer is reused for
+                    # every conversion — at 1080p the per-frame cvtColor
+                    # allocation alone is ~6 MB of malloc + write.
+                    if st.session_state.get("rgb_buf") is None \
+                            or st.session_state.rgb_buf.shape != annotated.shape:
+                        st.session_state.rgb_buf = np.empty_like(annotated)
+                    annotated_rgb = st.session_state.rgb_buf
+                    cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB, dst=annotated_rgb)
+                    stframe.image(annotated_rgb, channels="RGB", use_container_width=True)
+
+                    # ---------------------------
+                    # Process Violations
+                    # ---------------------------
+                    if violations:
+                        new_rows = []
+                        for v in violations:
+                            vtype = v.get("type", "unknown")
+                            plate = v.get("plate", "NOT_DETECTED")
+                            tid = v.get("track_id", -1)
+
+                            # 🔹 Snapshot save
+                            os.makedirs("snapshots", exist_ok=True)
+                            snapshot_name = f"snapshots/{time.strftime('%Y%m%d_%H%M%S')}_tid{tid}_{vtype}.jpg"
+                            # copy: "annotated" is reused by the loop before the writer runs
+                            snapshot_q.put((snapshot_name, annotated.copy()))
+
+                            # Save to MongoDB with snapshot_path
+                            record = {
+                                "vehicle_no": plate,
+                                "violation_type": vtype,
+                                "track_id": tid,
+                                "cls": v.get("cls_name", "unknown"),
+                                "conf": float(v.get("conf", 0.0)),
+                                "speed_kmph": v.get("speed_kmph"),
+                                "reason": v.get("reason", ""),
+                                "tl_state": v.get("tl_state", tl_state),
+                                "snapshot_path": snapshot_name,
+                                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                            }
+                            try:
+                                # Buffered: one insert_many round-trip per
+                                # ~64 records instead of one per violation
+                                insert_violation_buffered(record)
+                            except Exception as e:
+                                st.sidebar.error(f"DB Insert Error: {e}")
+
+                            # Append to session log
+                            row = {
+                                "Time": record["timestamp"],
+                                "Violation": vtype,
+                                "Plate": plate,
+                                "Track ID": tid,
+                                "Confidence": round(record["conf"], 2),
+                                "Speed": record["speed_kmph"],
+                                "Snapshot": snapshot_name,
+                            }
+                            st.session_state.violations_log.append(row)
+                            new_rows.append(row)
+                            # The full history is already in Mongo; keep
+                            # the in-session log bounded so rerun cost
+                            # doesn't grow for the whole session
+                            if len(st.session_state.violations_log) > 500:
+                                del st.session_state.violations_log[:-500]
+
+                            template = VIOLATION_TEMPLATES.get(
+                                vtype, f"**{vtype.upper()}** — {{cls}} (plate {{plate}})")
+                            violation_container.markdown(
+                                template.format(cls=v.get("cls_name", "?"), plate=plate)
+                            )
+                            violation_container.image(
+                                annotated_rgb,  # already converted above
+                                caption=f"Violation: {vtype} | Plate: {plate}",
+                                use_container_width=True
+                            )
+
+                        # Table update: append the new rows to a cached
+                        # DataFrame instead of rebuilding it from the whole
+                        # log, and re-render at most twice a second — the
+                        # arrow serialisation grows with the log otherwise.
+                        if new_rows:
+                            cached = st.session_state.get("violations_df")
+                            st.session_state.violations_df = (pd.concat(
+                                [cached, pd.DataFrame(new_rows)],
+                                ignore_index=True
+                            ) if cached is not None else pd.DataFrame(new_rows)).tail(500)
+                        now = time.monotonic()
+                        if now - st.session_state.get("last_table_render", 0.0) >= 0.5:
+                            df = st.session_state.violations_df
+                            if filter_type != "All":
+                                df = df[df["Violation"] == filter_type]
+                            # Only the newest rows are worth serializing
+                            table_placeholder.dataframe(df.tail(50), use_container_width=True)
+                            st.session_state.last_table_render = now
+
+                    next_t += target_dt
+                    delay = next_t - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        # behind real time — don't accumulate sleep debt
+                        next_t = time.perf_counter()
 
         finally:
+            if "stop_event" in locals():
+                stop_event.set()
+            # Let the reader notice the stop event and leave read()
+            # before the capture goes away — releasing a capture that a
+            # reader is mid-read() on is a crash, not an error return.
+            if "reader_t" in locals() and reader_t is not None:
+                while reader_t.is_alive():
+                    try:
+                        read_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    reader_t.join(timeout=0.1)
             if cap:
                 cap.release()
             if tmp_file and os.path.exists(tmp_file):
                 os.remove(tmp_file)
+            # Streamlit reruns don't trip the atexit hook, so push any
+            # buffered violations out before this script run ends
+            try:
+                flush_violations()
+            except Exception:
+                pass
 
 # ---------------------------
 # 📊 Audit Report Button
@@ -1,5 +1,7 @@
 from pymongo import MongoClient, DESCENDING
+import atexit
 import os
+import time
 
 # -------------------
 # MongoDB Config
@@ -14,25 +16,48 @@ PARKING_COLLECTION = "parking_status"
 # -------------------
 # MongoDB Client
 # -------------------
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-_db = client[MONGO_DB]
-
-# Collections
-violations_col = _db[VIOLATIONS_COLLECTION]
-reports_col = _db[REPORTS_COLLECTION]
-density_col = _db[DENSITY_COLLECTION]
-parking_col = _db[PARKING_COLLECTION]
-
-# Ensure indexes
-try:
-    violations_col.create_index([("violation_type", 1)])
-    violations_col.create_index([("timestamp", -1)])
-    reports_col.create_index([("date", -1)])
-    density_col.create_index([("timestamp", -1)])
-    parking_col.create_index([("timestamp", -1)])
-    parking_col.create_index([("location", 1)])
-except Exception as e:
-    print("[DB WARN] Index creation failed:", e)
+# The client is created lazily on first use so importing this module
+# (e.g. from the Streamlit dashboard) never blocks on an unreachable
+# Mongo. Pool and compression settings are tuned for the small, very
+# repetitive documents this app writes.
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = MongoClient(
+            MONGO_URI,
+            serverSelectionTimeoutMS=2000,
+            maxPoolSize=16,
+            compressors="zstd,snappy",
+            retryWrites=True,
+        )
+        _ensure_indexes(_client[MONGO_DB])
+    return _client
+
+
+def _col(name):
+    """Collection accessor — triggers client creation on first call."""
+    return _get_client()[MONGO_DB][name]
+
+
+def _ensure_indexes(db):
+    try:
+        # Compound indexes so filter-by-type (or track) + newest-first
+        # sort is a pure index walk instead of an in-memory sort.
+        db[VIOLATIONS_COLLECTION].create_index(
+            [("violation_type", 1), ("timestamp", -1)], background=True)
+        db[VIOLATIONS_COLLECTION].create_index(
+            [("track_id", 1), ("timestamp", -1)], background=True)
+        db[VIOLATIONS_COLLECTION].create_index([("timestamp", -1)],
+                                               background=True)
+        db[REPORTS_COLLECTION].create_index([("date", -1)])
+        db[DENSITY_COLLECTION].create_index([("timestamp", -1)])
+        db[PARKING_COLLECTION].create_index([("timestamp", -1)])
+        db[PARKING_COLLECTION].create_index([("location", 1)])
+    except Exception as e:
+        print("[DB WARN] Index creation failed:", e)
 
 
 # -------------------
@@ -40,18 +65,50 @@ except Exception as e:
 # -------------------
 def init_db():
     """Return violations collection (for backward compatibility)."""
-    return violations_col
+    return _col(VIOLATIONS_COLLECTION)
 
 
 # ------------------- Violations -------------------
 def insert_violation(record: dict):
     """Insert a violation record."""
     try:
-        violations_col.insert_one(dict(record))
+        _col(VIOLATIONS_COLLECTION).insert_one(dict(record))
     except Exception as e:
         print("[DB ERROR] insert_violation failed:", e)
 
 
+# Buffered inserts: the live loop can raise several violations per
+# second, and a round-trip per insert_one adds up. Records are batched
+# and flushed with one unordered insert_many.
+_pending_violations = []
+_last_flush = time.time()
+_FLUSH_COUNT = 64
+_FLUSH_SECONDS = 2.0
+
+
+def flush_violations():
+    """Flush any buffered violation records to MongoDB."""
+    global _last_flush
+    if _pending_violations:
+        try:
+            _col(VIOLATIONS_COLLECTION).insert_many(_pending_violations, ordered=False)
+        except Exception as e:
+            print("[DB ERROR] flush_violations failed:", e)
+        _pending_violations.clear()
+    _last_flush = time.time()
+
+
+def insert_violation_buffered(record: dict):
+    """Buffer a violation record, flushing every few records/seconds."""
+    _pending_violations.append(dict(record))
+    if (len(_pending_violations) >= _FLUSH_COUNT
+            or time.time() - _last_flush > _FLUSH_SECONDS):
+        flush_violations()
+
+
+atexit.register(flush_violations)
+
+
 def get_all_violations(filter_query: dict = None, limit: int = 25):
     """
     Fetch violations with optional filter.
@@ -60,12 +117,12 @@ def get_all_violations(filter_query: dict = None, limit: int = 25):
     try:
         if filter_query:
             return list(
-                violations_col.find(filter_query, {"_id": 0})
+                _col(VIOLATIONS_COLLECTION).find(filter_query, {"_id": 0})
                 .sort("timestamp", DESCENDING)
                 .limit(limit)
             )
         return list(
-            violations_col.find({}, {"_id": 0})
+            _col(VIOLATIONS_COLLECTION).find({}, {"_id": 0})
             .sort("timestamp", DESCENDING)
             .limit(limit)
         )
@@ -78,7 +135,7 @@ def get_all_violations(filter_query: dict = None, limit: int = 25):
 def insert_report(report: dict):
     """Insert an audit report."""
     try:
-        reports_col.insert_one(dict(report))
+        _col(REPORTS_COLLECTION).insert_one(dict(report))
     except Exception as e:
         print("[DB ERROR] insert_report failed:", e)
 
@@ -87,7 +144,7 @@ def get_all_reports(limit: int = 25):
     """Fetch audit reports (latest first)."""
     try:
         return list(
-            reports_col.find({}, {"_id": 0})
+            _col(REPORTS_COLLECTION).find({}, {"_id": 0})
             .sort("date", DESCENDING)
             .limit(limit)
         )
@@ -100,18 +157,28 @@ def get_all_reports(limit: int = 25):
 def insert_density_record(record: dict):
     """Insert a traffic density record."""
     try:
-        density_col.insert_one(dict(record))
+        _col(DENSITY_COLLECTION).insert_one(dict(record))
     except Exception as e:
         print("[DB ERROR] insert_density_record failed:", e)
+    try:
+        # Feed the forecaster's O(1) smoothing state (lazy import —
+        # predictive_layer imports this module)
+        from predictive_layer import update_smoothing
+        update_smoothing(record.get("vehicle_count", 0))
+    except ImportError:
+        pass
 
 
 def get_density_history(limit: int = 50):
-    """Fetch density history (latest first)."""
+    """Fetch density history (latest first). Only the fields the charts
+    use are projected, and the cursor batch size matches the limit so
+    the whole result arrives in one getMore."""
     try:
         return list(
-            density_col.find({}, {"_id": 0})
+            _col(DENSITY_COLLECTION).find({}, {"_id": 0, "timestamp": 1, "vehicle_count": 1})
             .sort("timestamp", DESCENDING)
             .limit(limit)
+            .batch_size(limit)
         )
     except Exception as e:
         print("[DB ERROR] get_density_history failed:", e)
@@ -122,7 +189,7 @@ def get_density_history(limit: int = 50):
 def insert_parking_status(record: dict):
     """Insert parking status record."""
     try:
-        parking_col.insert_one(dict(record))
+        _col(PARKING_COLLECTION).insert_one(dict(record))
     except Exception as e:
         print("[DB ERROR] insert_parking_status failed:", e)
 
@@ -131,8 +198,11 @@ def get_latest_parking(location: str = None):
     """Get latest parking status for a location."""
     try:
         query = {"location": location} if location else {}
+        projection = {"_id": 0, "location": 1, "total_slots": 1,
+                      "available_slots": 1, "occupied_slots": 1,
+                      "occupancy_rate": 1, "slots": 1}
         return list(
-            parking_col.find(query, {"_id": 0})
+            _col(PARKING_COLLECTION).find(query, projection)
             .sort("timestamp", DESCENDING)
             .limit(1)
         )
@@ -146,7 +216,7 @@ def get_parking_history(location: str = None, limit: int = 25):
     try:
         query = {"location": location} if location else {}
         return list(
-            parking_col.find(query, {"_id": 0})
+            _col(PARKING_COLLECTION).find(query, {"_id": 0})
             .sort("timestamp", DESCENDING)
             .limit(limit)
         )
@@ -15,6 +15,29 @@ except Exception:
 
 
 # ---------------- Helpers ----------------
+def _resolve_model_path(path):
+    """Prefer a TensorRT .engine export sitting next to the .pt weights.
+    Engines run on Tensor Cores with fused layers; the .pt stays the
+    fallback when no engine was built for this machine."""
+    engine = os.path.splitext(path)[0] + ".engine"
+    if os.path.exists(engine):
+        print(f"[INFO] Using TensorRT engine: {engine}")
+        return engine
+    return path
+
+
+def export_tensorrt(model_path, imgsz=640, batch=16):
+    """One-time build step: export .pt weights to a FP16 TensorRT engine
+    with dynamic batching. Needs CUDA + TensorRT installed."""
+    try:
+        model = YOLO(model_path)
+        model.export(format="engine", imgsz=imgsz, device=0,
+                     half=True, dynamic=True, batch=batch)
+        print(f"[INFO] Exported TensorRT engine for {model_path}")
+    except Exception as e:
+        print("[WARN] TensorRT export failed:", e)
+
+
 def clean_plate_text(text: str) -> str:
     if not text:
         return "NOT_DETECTED"
@@ -173,7 +196,7 @@ class TrafficDetector:
                  conf=0.6,
                  easyocr_gpu=False):
         ensure_dirs()
-        self.model = YOLO(model_path)
+        self.model = YOLO(_resolve_model_path(model_path))
         self.conf = conf
         self.db_coll = init_db()
         self.rule_engine = RuleEngine(db_conn=self.db_coll)
@@ -189,7 +212,7 @@ class TrafficDetector:
         ]
         # ✅ Plate model load
         if plate_model_path and os.path.exists(plate_model_path):
-            self.plate_model = YOLO(plate_model_path)
+            self.plate_model = YOLO(_resolve_model_path(plate_model_path))
             print(f"[INFO] Plate model loaded: {plate_model_path}")
         else:
             self.plate_model = None
@@ -212,23 +235,38 @@ class TrafficDetector:
         if cv2.countNonZero(mask_yellow) > 50: return "YELLOW"
         return "UNKNOWN"
 
-    def detect_frame(self, frame):
-        timestamp = time.time()
-        results = self.model(frame)
+    def _extract_dets(self, result):
+        """Pull filtered detections out of one ultralytics Results object."""
         dets = []
+        for box in getattr(result, "boxes", []):
+            coords = box.xyxy[0].cpu().numpy()
+            x1, y1, x2, y2 = map(int, coords)
+            conf = float(box.conf[0].cpu().numpy())
+            cls_id = int(box.cls[0])
+            name = self.model.names[cls_id]
+            if conf < self.conf or name not in self.valid_classes and name != "traffic light":
+                continue
+            dets.append({"cls": cls_id, "conf": conf,
+                         "bbox": (x1, y1, x2, y2),
+                         "cls_name": name})
+        return dets
 
-        for r in results:
-            for box in getattr(r, "boxes", []):
-                coords = box.xyxy[0].cpu().numpy()
-                x1, y1, x2, y2 = map(int, coords)
-                conf = float(box.conf[0].cpu().numpy())
-                cls_id = int(box.cls[0])
-                name = self.model.names[cls_id]
-                if conf < self.conf or name not in self.valid_classes and name != "traffic light":
-                    continue
-                dets.append({"cls": cls_id, "conf": conf,
-                             "bbox": (x1, y1, x2, y2),
-                             "cls_name": name})
+    def detect_frame(self, frame):
+        results = self.model(frame)
+        return self._process_frame(frame, self._extract_dets(results[0]))
+
+    def detect_batch(self, frames):
+        """Run one batched forward pass over several frames, then the
+        per-frame tracking/violation pipeline in capture order. Returns a
+        list of detect_frame-style result tuples."""
+        if not frames:
+            return []
+        results = self.model(frames)
+        return [self._process_frame(frame, self._extract_dets(result))
+                for frame, result in zip(frames, results)]
+
+    def _process_frame(self, frame, dets):
+        timestamp = time.time()
 
         # tracking
         tracked_list = []
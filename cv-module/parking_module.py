@@ -7,6 +7,12 @@ import numpy as np
 from datetime import datetime
 from db import insert_parking_status
 
+try:
+    from congestion_analyse import _kernels
+    KERNELS_AVAILABLE = _kernels.NUMBA_AVAILABLE
+except ImportError:
+    KERNELS_AVAILABLE = False
+
 
 class ParkingManager:
     """
@@ -18,7 +24,15 @@ class ParkingManager:
         self.parking_slots = []  # List of slot definitions
         self.slot_status = {}  # Track status of each slot
         self.last_update_time = None
-        
+        self._bounds = np.zeros((0, 4), dtype=np.float32)  # (S, 4) slot bounds
+        self._rect_slots = []  # True where the slot polygon is an axis-aligned rect
+        # Cached fill overlay for draw_slots_on_frame, rebuilt only when
+        # a slot changes status (statuses are stable across most frames).
+        self._overlay_bgr = None
+        self._overlay_mask = None
+        self._blend_buf = None
+        self._overlay_dirty = True
+
     def define_parking_slots(self, slots):
         """
         Define parking slot regions.
@@ -28,12 +42,48 @@ class ParkingManager:
                    [{"id": 1, "polygon": [(x1,y1), (x2,y2), (x3,y3), (x4,y4)]}, ...]
         """
         self.parking_slots = slots
+        # Precompute per-slot bounding boxes once so occupancy checks can
+        # test every centroid against every slot in a single broadcast.
+        self._bounds = np.array(
+            [[min(p[0] for p in slot["polygon"]),
+              min(p[1] for p in slot["polygon"]),
+              max(p[0] for p in slot["polygon"]),
+              max(p[1] for p in slot["polygon"])]
+             for slot in slots], dtype=np.float32
+        ).reshape(-1, 4)
+        self._rect_slots = [self._is_rect(slot["polygon"]) for slot in slots]
+        # Per-slot draw data built once — draw_slots_on_frame runs every
+        # frame and shouldn't re-allocate polygon arrays or re-average
+        # centroids each time.
+        self._polygons_np = [np.asarray(slot["polygon"], np.int32)
+                             for slot in slots]
+        self._centroids_np = [(int(np.mean(p[:, 0])), int(np.mean(p[:, 1])))
+                              for p in self._polygons_np]
+        self._slot_texts = [f"#{slot['id']}" for slot in slots]
+        self._overlay_dirty = True
+        # CSR layout of all slot vertices for the compiled multi-polygon
+        # test: vertices of slot s sit in _poly_x/y[_poly_starts[s]:s+1].
+        verts = [p for slot in slots for p in slot["polygon"]]
+        self._poly_x = np.array([v[0] for v in verts], dtype=np.float32)
+        self._poly_y = np.array([v[1] for v in verts], dtype=np.float32)
+        self._poly_starts = np.cumsum(
+            [0] + [len(slot["polygon"]) for slot in slots]).astype(np.int32)
         for slot in slots:
             self.slot_status[slot["id"]] = {
                 "status": "available",
                 "vehicle_id": None,
                 "occupied_since": None
             }
+
+    @staticmethod
+    def _is_rect(polygon):
+        """True if the polygon is an axis-aligned rectangle (the shape
+        auto_define_grid_slots produces), so its bounds are exact."""
+        if len(polygon) != 4:
+            return False
+        xs = {p[0] for p in polygon}
+        ys = {p[1] for p in polygon}
+        return len(xs) == 2 and len(ys) == 2
     
     def auto_define_grid_slots(self, frame_width, frame_height, rows=2, cols=3, 
                                start_x=50, start_y=100, slot_width=150, slot_height=80, 
@@ -88,33 +138,69 @@ class ParkingManager:
         Returns:
             dict: Updated slot status
         """
+        prev = [self.slot_status[s["id"]]["status"] for s in self.parking_slots]
+
         # Reset all slots to available first
         for slot_id in self.slot_status:
             self.slot_status[slot_id]["status"] = "available"
             self.slot_status[slot_id]["vehicle_id"] = None
-        
-        # Check each slot for vehicle presence
-        for slot in self.parking_slots:
+
+        if not self.parking_slots:
+            return self.slot_status
+
+        valid = [(i, o["centroid"]) for i, o in enumerate(tracked_objects)
+                 if o.get("centroid")]
+        if not valid:
+            self._note_status_changes(prev)
+            return self.slot_status
+        obj_idx = [i for i, _ in valid]
+        c = np.asarray([p for _, p in valid], dtype=np.float32)
+
+        exact = False
+        if KERNELS_AVAILABLE and not all(self._rect_slots):
+            # Odd-shaped slots: one compiled crossing-number pass over all
+            # centroids x all slots, no per-pair pointPolygonTest calls.
+            inside = _kernels.pip_batch_csr(
+                self._poly_x, self._poly_y, self._poly_starts,
+                np.ascontiguousarray(c[:, 0]), np.ascontiguousarray(c[:, 1]))
+            exact = True
+        else:
+            # One (V, S) broadcast compare replaces the per-slot,
+            # per-vehicle pointPolygonTest loop. Bounds are exact for
+            # rectangular slots; for odd-shaped slots they only
+            # prefilter the candidates.
+            b = self._bounds
+            inside = (c[:, None, 0] >= b[:, 0]) & (c[:, None, 0] <= b[:, 2]) & \
+                     (c[:, None, 1] >= b[:, 1]) & (c[:, None, 1] <= b[:, 3])
+
+        for s_idx, slot in enumerate(self.parking_slots):
+            hits = np.flatnonzero(inside[:, s_idx])
+            if hits.size == 0:
+                continue
+            if not exact and not self._rect_slots[s_idx]:
+                polygon = self._polygons_np[s_idx]
+                hits = [v for v in hits
+                        if cv2.pointPolygonTest(
+                            polygon, (float(c[v, 0]), float(c[v, 1])), False) >= 0]
+                if not hits:
+                    continue
+
             slot_id = slot["id"]
-            polygon = np.array(slot["polygon"], np.int32)
-            
-            # Check if any vehicle centroid is inside this slot
-            for obj in tracked_objects:
-                centroid = obj.get("centroid")
-                if centroid:
-                    point = (float(centroid[0]), float(centroid[1]))
-                    
-                    # Check if point is inside polygon
-                    if cv2.pointPolygonTest(polygon, point, False) >= 0:
-                        # Mark slot as occupied
-                        if self.slot_status[slot_id]["status"] == "available":
-                            self.slot_status[slot_id]["occupied_since"] = datetime.now()
-                        
-                        self.slot_status[slot_id]["status"] = "occupied"
-                        self.slot_status[slot_id]["vehicle_id"] = obj.get("track_id")
-                        break  # One vehicle per slot
-        
+            if self.slot_status[slot_id]["status"] == "available":
+                self.slot_status[slot_id]["occupied_since"] = datetime.now()
+            self.slot_status[slot_id]["status"] = "occupied"
+            # One vehicle per slot — keep the first match, like before
+            self.slot_status[slot_id]["vehicle_id"] = \
+                tracked_objects[obj_idx[int(hits[0])]].get("track_id")
+
+        self._note_status_changes(prev)
         return self.slot_status
+
+    def _note_status_changes(self, prev):
+        """Flag the draw overlay for rebuild when any slot flipped state."""
+        now = [self.slot_status[s["id"]]["status"] for s in self.parking_slots]
+        if now != prev:
+            self._overlay_dirty = True
     
     def get_availability_summary(self):
         """
@@ -177,28 +263,36 @@ class ParkingManager:
         Returns:
             frame: Image with slots drawn
         """
-        for slot in self.parking_slots:
-            slot_id = slot["id"]
-            polygon = np.array(slot["polygon"], np.int32)
-            status = self.slot_status[slot_id]["status"]
-            
-            # Color: Green for available, Red for occupied
+        # The semi-transparent fills only change when a slot flips status,
+        # so the color layer is rebuilt lazily instead of a full-frame
+        # copy + fillPoly + addWeighted per slot per frame.
+        if self._overlay_bgr is None or self._overlay_bgr.shape != frame.shape:
+            self._overlay_bgr = np.zeros_like(frame)
+            self._overlay_mask = np.zeros(frame.shape[:2], np.uint8)
+            self._blend_buf = np.empty_like(frame)
+            self._overlay_dirty = True
+        if self._overlay_dirty:
+            self._overlay_bgr[:] = 0
+            self._overlay_mask[:] = 0
+            for s_idx, slot in enumerate(self.parking_slots):
+                status = self.slot_status[slot["id"]]["status"]
+                # Color: Green for available, Red for occupied
+                color = (0, 255, 0) if status == "available" else (0, 0, 255)
+                cv2.fillPoly(self._overlay_bgr, [self._polygons_np[s_idx]], color)
+                cv2.fillPoly(self._overlay_mask, [self._polygons_np[s_idx]], 255)
+            self._overlay_dirty = False
+
+        # One blend for all slots, copied back only where a slot is filled
+        cv2.addWeighted(frame, 0.7, self._overlay_bgr, 0.3, 0, dst=self._blend_buf)
+        cv2.copyTo(self._blend_buf, self._overlay_mask, frame)
+
+        for s_idx, slot in enumerate(self.parking_slots):
+            status = self.slot_status[slot["id"]]["status"]
             color = (0, 255, 0) if status == "available" else (0, 0, 255)
-            
-            # Draw polygon
-            cv2.polylines(frame, [polygon], isClosed=True, color=color, thickness=2)
-            
-            # Fill with semi-transparent color
-            overlay = frame.copy()
-            cv2.fillPoly(overlay, [polygon], color)
-            cv2.addWeighted(overlay, 0.3, frame, 0.7, 0, frame)
-            
-            # Add slot ID text
-            centroid_x = int(np.mean([p[0] for p in slot["polygon"]]))
-            centroid_y = int(np.mean([p[1] for p in slot["polygon"]]))
-            
-            text = f"#{slot_id}"
-            cv2.putText(frame, text, (centroid_x - 15, centroid_y), 
+            cv2.polylines(frame, [self._polygons_np[s_idx]], isClosed=True,
+                          color=color, thickness=2)
+            centroid_x, centroid_y = self._centroids_np[s_idx]
+            cv2.putText(frame, self._slot_texts[s_idx], (centroid_x - 15, centroid_y),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         
         # Add summary text
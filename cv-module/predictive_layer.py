@@ -2,11 +2,49 @@
 Predictive Layer for Traffic Forecasting
 Uses historical MongoDB data to predict future traffic patterns.
 """
+import time
+
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from congestion_analyse import _kernels
 from db import get_density_history
 from datetime import datetime, timedelta
 
+# TTL cache over get_density_history keyed by limit — the dashboard
+# calls these analytics repeatedly within seconds for the same window,
+# and each call was a Mongo round-trip.
+_history_cache = {}
+
+
+def _cached_history(limit, ttl):
+    now = time.monotonic()
+    hit = _history_cache.get(limit)
+    if hit is not None and now - hit[0] < ttl:
+        return hit[1]
+    data = get_density_history(limit=limit)
+    _history_cache[limit] = (now, data)
+    return data
+
+
+# Holt-style exponential smoothing state, fed by update_smoothing from
+# the density-write path. Once primed, forecasts are O(1) reads of
+# (level, trend) with no DB fetch or history re-scan.
+_level = None
+_trend = 0.0
+_ALPHA = 0.3
+_BETA = 0.1
+
+
+def update_smoothing(new_count):
+    """Fold one new vehicle count into the running level/trend estimate.
+    Call this wherever a density record is written."""
+    global _level, _trend
+    if _level is None:
+        _level = float(new_count)
+        return
+    new_level = _ALPHA * new_count + (1 - _ALPHA) * (_level + _trend)
+    _trend = _BETA * (new_level - _level) + (1 - _BETA) * _trend
+    _level = new_level
+
 
 def predict_traffic_trend(minutes_ahead=15):
     """
@@ -19,8 +57,15 @@ def predict_traffic_trend(minutes_ahead=15):
         int: Predicted vehicle count per minute
     """
     try:
-        # Get historical data
-        history = get_density_history(limit=100)
+        # Smoothed state is primed by the live density writes — forecast
+        # straight from it and skip the history query entirely
+        if _level is not None:
+            steps = minutes_ahead / 5  # data every 5 mins
+            return int(max(0, min(_level + steps * _trend, 200)))
+
+        # Cold start (e.g. dashboard without a live writer): fall back
+        # to fitting the stored history
+        history = _cached_history(100, ttl=30)
         
         if not history or len(history) < 5:
             # Not enough data, return average or default
@@ -33,17 +78,19 @@ def predict_traffic_trend(minutes_ahead=15):
         if len(counts) < 10:
             return int(np.mean(counts))
         
-        # Prepare data for linear regression
-        X = np.arange(len(counts)).reshape(-1, 1)  # Time index
-        y = np.array(counts)
-        
-        # Train simple linear regression model
-        model = LinearRegression()
-        model.fit(X, y)
-        
-        # Predict for next time step
+        # Closed-form least-squares fit over the time index — identical
+        # result to LinearRegression without the estimator construction
+        # and validation overhead, which dwarfed the actual arithmetic
+        y = np.asarray(counts, dtype=np.float64)
         next_step = len(counts) + (minutes_ahead / 5)  # Assuming data every 5 mins
-        prediction = model.predict([[next_step]])[0]
+        if _kernels.NUMBA_AVAILABLE:
+            prediction = _kernels.ols_predict(y, float(next_step))
+        else:
+            x = np.arange(y.size, dtype=np.float64)
+            xm = x.mean()
+            ym = y.mean()
+            slope = ((x - xm) * (y - ym)).sum() / ((x - xm) ** 2).sum()
+            prediction = ym + slope * (next_step - xm)
         
         # Ensure prediction is reasonable (non-negative, not too extreme)
         prediction = max(0, min(prediction, 200))
@@ -55,6 +102,14 @@ def predict_traffic_trend(minutes_ahead=15):
         return 25  # Default fallback
 
 
+def _record_hour(record):
+    """Hour-of-day of a density record's timestamp (str or datetime)."""
+    timestamp = record.get('timestamp', datetime.now())
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return timestamp.hour
+
+
 def analyze_peak_hours(location="default"):
     """
     Analyze historical data to identify peak traffic hours.
@@ -63,7 +118,7 @@ def analyze_peak_hours(location="default"):
         dict: Peak hours analysis with time periods and congestion levels
     """
     try:
-        history = get_density_history(limit=500)
+        history = _cached_history(500, ttl=300)
         
         if not history:
             return {
@@ -72,33 +127,28 @@ def analyze_peak_hours(location="default"):
                 "avg_density": 0
             }
         
-        # Group by hour and calculate average density
-        hourly_data = {}
-        for record in history:
-            timestamp = record.get('timestamp', datetime.now())
-            if isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp)
-            
-            hour = timestamp.hour
-            count = record.get('vehicle_count', 0)
-            
-            if hour not in hourly_data:
-                hourly_data[hour] = []
-            hourly_data[hour].append(count)
-        
-        # Calculate averages
-        hourly_avg = {h: np.mean(counts) for h, counts in hourly_data.items()}
-        
-        # Find peak hours
-        if hourly_avg:
-            sorted_hours = sorted(hourly_avg.items(), key=lambda x: x[1], reverse=True)
-            peak_hour = sorted_hours[0][0] if sorted_hours else 9
-            
+        # Group by hour with two bincount reductions — one C pass each
+        # for the per-hour sums and counts, no dict-of-lists appends
+        hours = np.fromiter(
+            (_record_hour(r) for r in history), dtype=np.int8,
+            count=len(history))
+        counts = np.fromiter(
+            (r.get('vehicle_count', 0) for r in history), dtype=np.int32,
+            count=len(history))
+        sums = np.bincount(hours, weights=counts, minlength=24)
+        cnts = np.bincount(hours, minlength=24)
+        present = np.flatnonzero(cnts)
+
+        if present.size:
+            averages = sums[present] / cnts[present]
+            peak_hour = int(present[averages.argmax()])
+
             return {
                 "peak_morning": f"{peak_hour}:00",
                 "peak_evening": "5:00-7:00 PM",
-                "avg_density": int(np.mean(list(hourly_avg.values()))),
-                "hourly_data": hourly_avg
+                "avg_density": int(averages.mean()),
+                "hourly_data": {int(h): float(a)
+                                for h, a in zip(present, averages)}
             }
         
         return {"peak_morning": "9:00 AM", "peak_evening": "6:00 PM", "avg_density": 0}
@@ -116,23 +166,26 @@ def detect_congestion_trend():
         str: "increasing", "decreasing", or "stable"
     """
     try:
-        recent_data = get_density_history(limit=10)
+        recent_data = _cached_history(10, ttl=10)
         
         if len(recent_data) < 5:
             return "stable"
         
-        counts = [record.get('vehicle_count', 0) for record in recent_data]
-        
-        # Compare first half vs second half
-        mid = len(counts) // 2
-        first_half_avg = np.mean(counts[:mid])
-        second_half_avg = np.mean(counts[mid:])
-        
+        # Compare first half vs second half with integer sums: for ten
+        # values the np.mean dispatch costs more than the arithmetic,
+        # and cross-multiplying avoids the divisions outright
+        n = len(recent_data)
+        mid = n // 2
+        s1 = sum(r.get('vehicle_count', 0) for r in recent_data[:mid])
+        s2 = sum(r.get('vehicle_count', 0) for r in recent_data[mid:])
+
         diff_threshold = 5
-        
-        if second_half_avg - first_half_avg > diff_threshold:
+
+        # s2/(n-mid) - s1/mid > threshold, with both sides scaled by
+        # mid*(n-mid)
+        if s2 * mid - s1 * (n - mid) > diff_threshold * mid * (n - mid):
             return "increasing"
-        elif first_half_avg - second_half_avg > diff_threshold:
+        elif s1 * (n - mid) - s2 * mid > diff_threshold * mid * (n - mid):
             return "decreasing"
         else:
             return "stable"
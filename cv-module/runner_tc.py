@@ -0,0 +1,371 @@
+# runner_tc.py
+# Traffic-congestion runner: tracks vehicles with YOLO, assigns them to
+# lane polygons (from the calibration tool when available, otherwise
+# estimated from where traffic actually drives) and rolls per-lane
+# density/speed into a congestion state.
+import argparse
+import atexit
+import logging
+import os
+import queue
+from collections import defaultdict, deque
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from callibirate_lanes import load_lanes
+from congestion_analyse import _kernels, density as _density
+from congestion_analyse import (
+    CongestionDetector,
+    build_lane_polygons,
+    compute_average_speed,
+    compute_density_from_weights,
+    points_in_convex_polygon,
+    register_class_names,
+)
+
+try:
+    from matplotlib.path import Path as MplPath
+    MPL_AVAILABLE = True
+except ImportError:
+    MPL_AVAILABLE = False
+
+MODEL_PATH = "models/yolov8n.pt"
+LANES_PATH = "lane_polygons.npz"
+FRAME_SKIP = 2  # analyse every Nth frame
+BATCH = 4  # frames per batched model.track call
+MIN_POINTS_FOR_ESTIMATE = 30  # centroids needed before guessing geometry
+LANE_RECOMPUTE_INTERVAL = 30  # sampled frames between lane re-estimates
+
+ALLOWED_CLASSES = {"car", "truck", "bus", "motorbike", "bicycle"}
+
+LANE_COLORS = {1: (0, 255, 0), 2: (0, 200, 255)}
+LANE_LABEL_ORIGINS = {1: (10, 25), 2: (10, 47)}
+
+# Per-frame status lines go through a queue-fed logger: the hot loop
+# only enqueues the record, while formatting, encoding and the stdout
+# flush happen on the listener's thread.
+_log_q = queue.SimpleQueue()
+_handler = logging.StreamHandler()
+# Timestamps come from the record's creation time and are rendered by
+# the listener thread — the hot loop never touches strftime
+_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s",
+                                        datefmt="%H:%M:%S"))
+_listener = QueueListener(_log_q, _handler)
+_listener.start()
+atexit.register(_listener.stop)
+log = logging.getLogger("runner_tc")
+log.addHandler(QueueHandler(_log_q))
+log.setLevel(logging.INFO)
+
+
+def estimate_road_roi(points, margin=20):
+    """Bounding box of everywhere vehicles have been seen, padded a bit.
+
+    points is an (N, 2) array slice of the centroid ring buffer, so the
+    min/max reductions run on zero-copy column views."""
+    x = points[:, 0]
+    y = points[:, 1]
+    return (max(int(x.min()) - margin, 0), max(int(y.min()) - margin, 0),
+            int(x.max()) + margin, int(y.max()) + margin)
+
+
+def estimate_lane_divider(points, road_roi, nbins=50):
+    """Find the divider as the least-driven x band inside the road ROI —
+    vehicles cluster in lanes, leaving a gap at the lane boundary."""
+    if _kernels.NUMBA_AVAILABLE:
+        # np.histogram's generic setup dominates at a few hundred points;
+        # the compiled scan bins and argmins in one pass
+        xs = points[:, 0].astype(np.float32)
+        return int(_kernels.divider_x(xs, float(road_roi[0]),
+                                      float(road_roi[2]), nbins))
+    counts, bins = np.histogram(points[:, 0], bins=nbins,
+                                range=(road_roi[0], road_roi[2]))
+    # Ignore the outer quarters: the emptiest bins are off the road
+    lo = nbins // 4
+    hi = nbins - nbins // 4
+    gap = lo + int(np.argmin(counts[lo:hi]))
+    return int((bins[gap] + bins[gap + 1]) * 0.5)
+
+
+@lru_cache(maxsize=16)
+def lane_polys_for(road_roi, divider_x):
+    """Lane polygons plus their OpenCV contour arrays for a given
+    geometry. Memoized — the estimated divider lands on the same couple
+    of values frame after frame, and the int32 reshape for polylines is
+    pure allocation churn if redone per frame."""
+    lane1_poly, lane2_poly = build_lane_polygons(road_roi, divider_x)
+    lane1_np = np.asarray(lane1_poly, dtype=np.int32).reshape(-1, 1, 2)
+    lane2_np = np.asarray(lane2_poly, dtype=np.int32).reshape(-1, 1, 2)
+    return lane1_poly, lane2_poly, lane1_np, lane2_np
+
+
+# matplotlib Path objects cached per polygon, mirroring the normals
+# cache in congestion_analyse.lane_geometry: keyed by vertex content
+# (an id() key can be recycled after an estimated polygon is collected,
+# which would resolve to the wrong lane geometry) and cleared if the
+# drifting estimates ever pile up too many entries.
+_mpl_paths = {}
+
+
+def _mpl_path(poly):
+    key = tuple(map(tuple, poly))
+    path = _mpl_paths.get(key)
+    if path is None:
+        if len(_mpl_paths) >= 64:
+            _mpl_paths.clear()
+        path = _mpl_paths[key] = MplPath(np.asarray(poly))
+    return path
+
+
+def _lane_masks(centroids, lane1_poly, lane2_poly):
+    """Boolean (in lane 1, in lane 2) masks for all centroids — two
+    batched C-level containment calls instead of a Python ray-cast per
+    vehicle per lane."""
+    if MPL_AVAILABLE:
+        in1 = _mpl_path(lane1_poly).contains_points(centroids)
+        in2 = ~in1 & _mpl_path(lane2_poly).contains_points(centroids)
+    else:
+        in1 = points_in_convex_polygon(centroids, lane1_poly)
+        in2 = ~in1 & points_in_convex_polygon(centroids, lane2_poly)
+    return in1, in2
+
+
+def _load_model(path):
+    """Load the detector at the cheapest precision available. A TensorRT
+    .engine exported next to the .pt wins outright (already FP16 with
+    fused layers, like detector.py's resolver); otherwise the .pt loads
+    as-is and we ask for half-precision inference when a GPU is present
+    — FP16 halves the weight bytes fetched per layer. FP32 remains the
+    CPU fallback.
+
+    Returns:
+        (model, use_half): the YOLO model and whether track() calls
+        should pass half=True.
+    """
+    engine = os.path.splitext(path)[0] + ".engine"
+    if os.path.exists(engine):
+        print("[TC] Using TensorRT engine:", engine)
+        return YOLO(engine), False
+    return YOLO(path), torch.cuda.is_available()
+
+
+def run(video_path, lanes_path=LANES_PATH, display=False):
+    model, use_half = _load_model(MODEL_PATH)
+    # Resolve the allowed class names to int ids once — the per-frame
+    # filter then compares integers instead of looking up, lowercasing
+    # and list-searching a name per box
+    allowed_cls_ids = np.array(
+        [i for i, n in model.names.items()
+         if str(n).lower() in ALLOWED_CLASSES], dtype=np.int32)
+    # Intern class weights by id so per-frame density lookups are a
+    # single fancy index into a float32 table
+    register_class_names(model.names)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print("Could not open:", video_path)
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    lane1_poly = lane2_poly = None
+    lane1_np = lane2_np = None
+    calibrated = os.path.exists(lanes_path)
+    if calibrated:
+        lane_data = load_lanes(lanes_path)
+        lane1_poly = [tuple(p) for p in lane_data["lane_1"]]
+        lane2_poly = [tuple(p) for p in lane_data["lane_2"]]
+        # Calibrated polygons never change: convert to the contour shape
+        # cv2.polylines expects exactly once, not per frame
+        lane1_np = np.asarray(lane1_poly, dtype=np.int32).reshape(-1, 1, 2)
+        lane2_np = np.asarray(lane2_poly, dtype=np.int32).reshape(-1, 1, 2)
+        print("[TC] Using calibrated lanes from", lanes_path)
+    else:
+        print("[TC] No calibration found — estimating lanes from traffic")
+
+    # Recent centroids live in a fixed (500, 2) ring buffer instead of a
+    # deque of tuples: appends are an array store, and the estimators get
+    # contiguous column views instead of rebuilding lists each call
+    vehicle_points = np.empty((500, 2), dtype=np.int32)
+    vp_n = 0
+    vp_idx = 0
+    # Only the last two positions of a track are ever read; bounded
+    # deques keep per-track memory constant over long videos instead of
+    # growing a list for the whole run
+    track_history = defaultdict(lambda: deque(maxlen=16))
+    lane_state = {1: CongestionDetector(window_size=15),
+                  2: CongestionDetector(window_size=15)}
+    # Rendered lane labels, rebuilt only when the displayed values
+    # change — the congestion state is sticky and occupancy/speed are
+    # rounded for display, so most frames reuse the previous string
+    lane_label = {1: (None, ""), 2: (None, "")}
+
+    # Accumulate BATCH sampled frames and track them in one call:
+    # Ultralytics fuses preprocessing and the model forward across a
+    # list of frames, so the fixed per-call dispatch cost is paid once
+    # per BATCH frames instead of once per frame. Skipped frames are
+    # grab()'d and dropped before the decoder runs.
+    frame_buf = []
+    frame_count = 0
+    skip_left = 0
+    stop = False
+    while not stop:
+        grabbed = cap.grab()
+        if grabbed:
+            if skip_left:
+                skip_left -= 1
+                continue
+            skip_left = FRAME_SKIP - 1
+            ok, frame = cap.retrieve()
+            grabbed = ok
+            if ok:
+                frame_buf.append(frame)
+                if len(frame_buf) < BATCH:
+                    continue
+        if not frame_buf:
+            break
+        # Flush a full window (or the partial one left at end of video)
+        results_list = model.track(frame_buf, persist=True, verbose=False,
+                                   half=use_half)
+        for frame, results in zip(frame_buf, results_list):
+            frame_count += 1
+            # SoA frame state: flat int32 arrays instead of a dict per
+            # vehicle — downstream consumers index rows, and the centroid
+            # arithmetic is one vectorized shift-add for the whole frame
+            boxes = np.zeros((0, 4), dtype=np.int32)
+            ids = np.zeros(0, dtype=np.int32)
+            cls_rows = np.zeros(0, dtype=np.int32)
+            centroids = np.zeros((0, 2), dtype=np.int32)
+            res_boxes = results.boxes
+            if res_boxes is not None and res_boxes.id is not None:
+                # Bulk tensor -> int32 array extraction, one transfer per
+                # field instead of per-box indexing into the tensors
+                xyxy = res_boxes.xyxy.cpu().numpy().astype(np.int32)
+                all_ids = res_boxes.id.cpu().numpy().astype(np.int32)
+                cls_idx = res_boxes.cls.cpu().numpy().astype(np.int32)
+                keep = np.isin(cls_idx, allowed_cls_ids)
+                boxes = xyxy[keep]
+                ids = all_ids[keep]
+                cls_rows = cls_idx[keep]
+                centroids = (boxes[:, [0, 1]] + boxes[:, [2, 3]]) >> 1
+                m = centroids.shape[0]
+                if m:
+                    # vectorized ring-buffer write of this frame's centroids
+                    slots = (vp_idx + np.arange(m)) % 500
+                    vehicle_points[slots] = centroids
+                    vp_idx = int((vp_idx + m) % 500)
+                    vp_n = min(vp_n + m, 500)
+                    for tid, (cx, cy) in zip(ids, centroids):
+                        track_history[int(tid)].append((int(cx), int(cy)))
+
+            if not calibrated:
+                if vp_n < MIN_POINTS_FOR_ESTIMATE:
+                    if display:
+                        cv2.imshow("Congestion Monitor", frame)
+                        if cv2.waitKey(1) & 0xFF == ord("q"):
+                            stop = True
+                            break
+                    continue
+                # Lane geometry is near-stationary while vehicle_points
+                # drifts by a handful of entries per frame — re-estimate
+                # every LANE_RECOMPUTE_INTERVAL frames, not every frame
+                if lane1_poly is None or \
+                        frame_count % LANE_RECOMPUTE_INTERVAL == 0:
+                    live = vehicle_points[:vp_n]
+                    road_roi = estimate_road_roi(live)
+                    divider_x = estimate_lane_divider(live, road_roi)
+                    lane1_poly, lane2_poly, lane1_np, lane2_np = \
+                        lane_polys_for(road_roi, divider_x)
+
+            # Assign each vehicle to a lane by its centroid, all at once
+            lane_rows = {1: np.zeros(0, dtype=np.intp),
+                         2: np.zeros(0, dtype=np.intp)}
+            if centroids.shape[0]:
+                in1, in2 = _lane_masks(centroids.astype(np.float32),
+                                       lane1_poly, lane2_poly)
+                lane_rows[1] = np.flatnonzero(in1)
+                lane_rows[2] = np.flatnonzero(in2)
+
+            weights = _density.CLS_WEIGHT_BY_ID[cls_rows]
+            states = {}
+            for lane_id in (1, 2):
+                rows = lane_rows[lane_id]
+                density = compute_density_from_weights(weights[rows])
+                speed = compute_average_speed(
+                    {int(t): track_history[int(t)] for t in ids[rows]},
+                    fps=fps / FRAME_SKIP)
+                lane_state[lane_id].update(density["density_level"],
+                                           speed["speed_level"])
+                states[lane_id] = (lane_state[lane_id].get_state(), density, speed)
+
+            # Drawing and the window only exist for a human viewer; in
+            # headless/batch runs all that rasterization is skipped
+            if display:
+                cv2.polylines(frame, [lane1_np], True, LANE_COLORS[1], 2)
+                cv2.polylines(frame, [lane2_np], True, LANE_COLORS[2], 2)
+                for lane_id in (1, 2):
+                    rows = lane_rows[lane_id]
+                    if rows.size:
+                        # One vectorized hypot over the lane instead of
+                        # a per-vehicle Python speed computation
+                        tracks = [track_history[int(t)] for t in ids[rows]]
+                        curr = np.array([t[-1] for t in tracks],
+                                        dtype=np.float32)
+                        prev = np.array(
+                            [t[-2] if len(t) >= 2 else t[-1] for t in tracks],
+                            dtype=np.float32)
+                        speeds = np.hypot(curr[:, 0] - prev[:, 0],
+                                          curr[:, 1] - prev[:, 1]) * (fps / FRAME_SKIP)
+                    else:
+                        speeds = ()
+                    for i, spd in zip(rows, speeds):
+                        x1, y1, x2, y2 = boxes[i]
+                        cv2.rectangle(frame, (int(x1), int(y1)),
+                                      (int(x2), int(y2)),
+                                      LANE_COLORS[lane_id], 1)
+                        cv2.putText(frame, f"{spd:.0f}", (int(x1), int(y1) - 4),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.4,
+                                    LANE_COLORS[lane_id], 1)
+                    state, density, speed = states[lane_id]
+                    shown = (state, round(density["occupancy"], 1),
+                             round(speed["avg_speed"]))
+                    if shown != lane_label[lane_id][0]:
+                        lane_label[lane_id] = (shown,
+                                               f"Lane {lane_id}: {state} "
+                                               f"(occ {shown[1]:.1f}, "
+                                               f"spd {shown[2]})")
+                    cv2.putText(frame, lane_label[lane_id][1],
+                                LANE_LABEL_ORIGINS[lane_id],
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                                LANE_COLORS[lane_id], 2)
+
+            log.info("L1=%s L2=%s vehicles=%d",
+                     states[1][0], states[2][0], centroids.shape[0])
+
+            if display:
+                cv2.imshow("Congestion Monitor", frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    stop = True
+                    break
+
+        frame_buf.clear()
+        if not grabbed:
+            break
+
+    cap.release()
+    if display:
+        cv2.destroyAllWindows()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lane congestion runner")
+    parser.add_argument("video", nargs="?", default=0,
+                        help="Video path (default: webcam 0)")
+    parser.add_argument("--lanes", default=LANES_PATH,
+                        help="Calibration file from callibirate_lanes")
+    parser.add_argument("--display", action="store_true",
+                        help="Show the annotated video window")
+    args = parser.parse_args()
+    run(args.video, args.lanes, display=args.display)